@@ -1,7 +1,13 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
 import torch
 import torch.nn as nn
 import cv2
-import mediapipe as mp
 
 # CNN Model
 class MERCnnModel(nn.Module):
@@ -57,16 +63,217 @@ def predict_image(image, model, device):
     _, preds  = torch.max(yb, dim=1) # pick class with highest probability
     return classes[preds[0].item()] # return class label
 
-findFace = mp.solutions.face_detection.FaceDetection()
-def faceBox(frame):#face bounding box
+# Batched prediction: returns the label and class probabilities for every image in the batch
+def predict_batch(images, model, device):
+    with torch.no_grad():
+        yb = model(to_device(images, device))
+        probs = torch.softmax(yb, dim=1)
+        _, preds = torch.max(yb, dim=1)
+    return [classes[i] for i in preds.tolist()], probs.cpu()
+
+# Preprocessing: face crops are resized straight into a preallocated uint8 batch buffer and
+# converted to the normalized float tensor in one step per batch (same layout/scale as ToTensor)
+CROP_SIZE = 80
+class FaceCropBuffer:
+    def __init__(self, capacity=32, size=CROP_SIZE):
+        self.capacity = capacity
+        self.size = size
+        self.images = np.empty((capacity, size, size, 3), dtype=np.uint8) # N x H x W x C (BGR)
+        self.tensor = torch.empty((capacity, 3, size, size), dtype=torch.float32) # N x C x H x W
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def full(self):
+        return self.count >= self.capacity
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, frame, box=None): # resize the box (or the whole frame) into the next free slot
+        if self.full():
+            raise ValueError("FaceCropBuffer is full")
+        face = frame
+        if box is not None:
+            x,y,w,h = box
+            x,y = max(x,0),max(y,0)
+            face = frame[y:y+h,x:x+w]
+        if face.size == 0:
+            raise ValueError("Empty face crop")
+        cv2.resize(face,(self.size,self.size),dst=self.images[self.count])
+        self.count += 1
+        return self.count - 1
+
+    def add_crops(self, crops): # copy already-resized uint8 crops (n x H x W x C) into the buffer
+        n = len(crops)
+        if self.count + n > self.capacity:
+            raise ValueError("FaceCropBuffer is full")
+        self.images[self.count:self.count+n] = crops
+        self.count += n
+
+    def drop_last(self): # discard the crop added last (e.g. when a PredictionGate skips it)
+        if self.count > 0:
+            self.count -= 1
+
+    def to_tensor(self): # view over the reused float buffer, valid until the next call
+        n = self.count
+        out = self.tensor[:n]
+        out.copy_(torch.from_numpy(self.images[:n]).permute(0,3,1,2))
+        out.mul_(1.0/255)
+        return out
+
+# Frame-difference gating: a crop whose small grayscale thumbnail is within `threshold` (mean
+# absolute difference, 0-1 scale) of the last inferred crop of the same track reuses that
+# crop's prediction instead of running the CNN again
+class GatedPrediction:
+    __slots__ = ("label", "probs", "repeats")
+    def __init__(self):
+        self.label = None # filled in once the reference crop has been inferred
+        self.probs = None
+        self.repeats = 0 # skipped crops that matched while the prediction was still pending
+
+class PredictionGate:
+    def __init__(self, threshold=0.02, size=16):
+        if not 0 <= threshold <= 1:
+            raise ValueError("PredictionGate threshold must be between 0 and 1")
+        self.threshold = threshold
+        self.size = size
+        self._tracks = {} # track id -> (signature, GatedPrediction) of the last inferred crop
+        self.total = 0
+        self.skipped = 0
+
+    def signature(self, crop):
+        gray = cv2.cvtColor(crop,cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray,(self.size,self.size),interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def match(self, track, crop): # returns (GatedPrediction, hit); on a miss the caller must infer
+        self.total += 1
+        sig = self.signature(crop)
+        last = self._tracks.get(track)
+        if last is not None and float(np.mean(np.abs(sig - last[0]))) / 255 <= self.threshold:
+            self.skipped += 1
+            return last[1], True
+        entry = GatedPrediction()
+        self._tracks[track] = (sig, entry)
+        return entry, False
+
+    @property
+    def skip_rate(self):
+        return self.skipped / self.total if self.total else 0.0
+
+    def reset(self): # forget cached crops (stats are kept)
+        self._tracks.clear()
+
+# Face detection: MediaPipe detectors are not thread-safe, so each caller checks out its own
+# instance from a pool. Detectors (and the mediapipe import) are created on first use.
+class FaceDetectorPool:
+    def __init__(self, max_size=None, model_selection=0, min_detection_confidence=0.5):
+        self.max_size = max_size or os.cpu_count() or 1
+        self.model_selection = model_selection
+        self.min_detection_confidence = min_detection_confidence
+        self._idle = [] # used as a stack so a thread tends to get back the instance it just used
+        self._created = 0 # detectors built or being built
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _create(self):
+        import mediapipe as mp
+        return mp.solutions.face_detection.FaceDetection(
+            model_selection=self.model_selection,
+            min_detection_confidence=self.min_detection_confidence)
+
+    def checkout(self, timeout=None): # blocks until a detector is free once max_size exist
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("FaceDetectorPool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.max_size:
+                    self._created += 1 # reserve the slot, build outside the lock
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No face detector became free in time")
+                self._cond.wait(remaining)
+        try:
+            return self._create()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify() # let a waiter try to build one instead
+            raise
+
+    def checkin(self, detector):
+        with self._cond:
+            if not self._closed:
+                self._idle.append(detector)
+                self._cond.notify()
+                return
+        detector.close()
+
+    @contextmanager
+    def detector(self, timeout=None):
+        detector = self.checkout(timeout)
+        try:
+            yield detector
+        finally:
+            self.checkin(detector)
+
+    def warm_up(self, count=1): # build `count` detectors ahead of time
+        detectors = [self.checkout() for _ in range(min(count, self.max_size))]
+        for detector in detectors:
+            self.checkin(detector)
+
+    def close(self): # close idle detectors now, checked-out ones when they are returned
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all() # waiters in checkout() wake up and raise
+        for detector in idle:
+            detector.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_detector_pool = None
+_detector_pool_lock = threading.Lock()
+def get_detector_pool():
+    global _detector_pool
+    with _detector_pool_lock:
+        if _detector_pool is None:
+            _detector_pool = FaceDetectorPool()
+        return _detector_pool
+
+def configure_face_detection(max_size=None, model_selection=0, min_detection_confidence=0.5):
+    """Replace the default detector pool used by faceBox, closing the previous one."""
+    global _detector_pool
+    with _detector_pool_lock:
+        old, _detector_pool = _detector_pool, FaceDetectorPool(max_size, model_selection, min_detection_confidence)
+    if old is not None:
+        old.close()
+    return _detector_pool
+
+@atexit.register
+def _close_detector_pool():
+    if _detector_pool is not None:
+        _detector_pool.close()
+
+def faceBox(frame, pool=None):#face bounding box; safe to call from multiple threads
     frameRGB = cv2.cvtColor(frame,cv2.COLOR_BGR2RGB)
     height = frame.shape[0]
     width = frame.shape[1]
-    results = findFace.process(frameRGB)
     myFaces = []
-    if results.detections != None:
-        for face in results.detections:
-            bBox = face.location_data.relative_bounding_box
-            x,y,w,h = int(bBox.xmin*width),int(bBox.ymin*height),int(bBox.width*width),int(bBox.height*height)
-            myFaces.append((x,y,w,h))
+    with (pool or get_detector_pool()).detector() as findFace:
+        results = findFace.process(frameRGB)
+        if results.detections != None:
+            for face in results.detections:
+                bBox = face.location_data.relative_bounding_box
+                x,y,w,h = int(bBox.xmin*width),int(bBox.ymin*height),int(bBox.width*width),int(bBox.height*height)
+                myFaces.append((x,y,w,h))
     return myFaces
\ No newline at end of file
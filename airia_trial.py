@@ -1,31 +1,59 @@
+import os
 import requests
 import json
+import threading
 import uuid
 
+from requestScheduler import INTERACTIVE, get_scheduler
+
 API_KEY = "ak-NDIyMTk5MjExMXwxNzYyNjM0MjQ1Nzc2fHRpLVEyRnlibVZuYVdVZ1RXVnNiRzl1SUZWdWFYWmxjbk5wZEhrdFQzQmxiaUJTWldkcGMzUnlZWFJwYjI0dFVISnZabVZ6YzJsdmJtRnNYMlkxTkRNNU9ETmhMVFEyWW1NdE5HWXdNaTFpWWpNMExXTXdZak5pWW1Nek9Ua3lOQT09fDF8MzM1MzcwNjM1NyAg"
 PIPELINE_GUID = "ec961148-6f84-44d6-a175-9bd314e24306"
-API_URL = f"https://api.airia.ai/v2/PipelineExecution/{PIPELINE_GUID}"
-
-def queryAIRIA(convo_txt: str, user_input: str, emotion: str):
-    """
-    Sends a formatted query to your Airia agent and returns the AI's responses as a list.
-    """
+# Override to point at a local stand-in server (e.g. http://127.0.0.1:8001) for testing.
+AIRIA_BASE_URL = os.getenv("AIRIA_BASE_URL", "https://api.airia.ai").rstrip("/")
+API_URL = f"{AIRIA_BASE_URL}/v2/PipelineExecution/{PIPELINE_GUID}"
 
+def _format_prompt(convo_txt: str, user_input: str, emotion: str, context: str = "") -> str:
     # Construct the prompt exactly as your model expects
     formatted_prompt = (
         f"Convo_txt: {convo_txt} "
         f"user_input: {user_input} "
         f"Emotion: {emotion}"
     )
+    if context:
+        formatted_prompt = f"Context: {context} " + formatted_prompt
+    return formatted_prompt
+
+
+def queryAIRIA(convo_txt: str, user_input: str, emotion: str, priority: int = INTERACTIVE):
+    """
+    Sends a formatted query to your Airia agent and returns the AI's responses as a list.
+
+    Calls go through the "airia" request scheduler: they are rate limited, interactive
+    calls run ahead of batch ones (priority=requestScheduler.BATCH), and identical
+    concurrent queries share a single upstream request.
+
+    Every call starts a new conversation; use AiriaSession for multi-turn use.
+    """
+    formatted_prompt = _format_prompt(convo_txt, user_input, emotion)
 
     # Generate a new userId (valid GUID)
     user_id = str(uuid.uuid4())
 
+    return get_scheduler("airia").call(
+        ("query", convo_txt, user_input, emotion),
+        _post_query, formatted_prompt, user_id,
+        priority=priority
+    )
+
+
+def _post_query(formatted_prompt: str, user_id: str, conversation_id: str = None):
     payload = {
         "userId": user_id,
         "userInput": formatted_prompt,
         "asyncOutput": False
     }
+    if conversation_id:
+        payload["conversationId"] = conversation_id
 
     headers = {
         "X-API-KEY": API_KEY,
@@ -45,6 +73,123 @@ def queryAIRIA(convo_txt: str, user_input: str, emotion: str):
     return {"responses": responses}
 
 
+def _count_tokens(text: str) -> int:
+    # Whitespace words: a cheap, stable stand-in for model tokens when budgeting
+    return len(text.split())
+
+
+def _tail_tokens(text: str, limit: int) -> str:
+    words = text.split()
+    return " ".join(words[-limit:]) if limit > 0 else ""
+
+
+_TAIL_CHARS = 256
+
+
+class AiriaSession:
+    """
+    A multi-turn conversation with the Airia agent.
+
+    The session keeps a stable userId/conversationId so the agent holds the history
+    server-side, and each turn sends only the part of the transcript that is new since
+    the previous turn, so per-turn cost does not grow with conversation length.
+
+    Args:
+        turn_budget: Max tokens (whitespace words) of new transcript sent per turn;
+            older words of an oversized delta are dropped.
+        context_budget: Max tokens sent over the life of one server-side conversation.
+            Past it the session compacts: it starts a fresh conversation seeded with
+            the most recent `carry_tokens` of transcript.
+        carry_tokens: Tokens of recent transcript carried into a compacted conversation.
+        priority: Default scheduler lane for this session's calls.
+        running_transcript: How query() reads convo_txt. False (default): convo_txt is
+            only the new speech for this turn (e.g. one clip's transcript) and is sent
+            as is. True: convo_txt is the whole transcript so far, and only the text
+            after what earlier turns already sent goes out; it must extend the
+            previous turn's transcript.
+
+    A session may be shared between threads; its turns are sent one at a time.
+    """
+
+    def __init__(self, turn_budget: int = 512, context_budget: int = 4096, carry_tokens: int = 256,
+                 priority: int = INTERACTIVE, user_id: str = None, running_transcript: bool = False):
+        self.turn_budget = turn_budget
+        self.context_budget = context_budget
+        self.carry_tokens = carry_tokens
+        self.priority = priority
+        self.running_transcript = running_transcript
+        self.user_id = user_id or str(uuid.uuid4())
+        self._lock = threading.Lock()
+        self.reset()
+
+    def _delta(self, convo_txt: str) -> str:
+        # Pure: state only advances once the turn has been sent successfully
+        if not self.running_transcript:
+            return convo_txt.strip()
+
+        # Comparing the length and a short tail (not the whole history) keeps this O(1) per turn
+        n = self._seen_len
+        if len(convo_txt) < n or convo_txt[n - len(self._seen_tail):n] != self._seen_tail:
+            raise ValueError("convo_txt does not extend the transcript of the previous turn; "
+                             "pass the full running transcript or call reset()")
+        return convo_txt[n:].strip()
+
+    def query(self, convo_txt: str, user_input: str, emotion: str, priority: int = None) -> dict:
+        """Send one turn and return {"responses": [...]} like queryAIRIA.
+
+        priority overrides the session's default lane for this call. If the request
+        fails, the session is left unchanged, so retrying sends the same transcript.
+        """
+        # Turns are serialized: concurrent callers would otherwise build on the same
+        # state and one of their commits would be lost
+        with self._lock:
+            delta = self._delta(convo_txt)
+            if _count_tokens(delta) > self.turn_budget:
+                delta = _tail_tokens(delta, self.turn_budget)
+
+            conversation_id = self.conversation_id
+            sent_tokens = self._sent_tokens
+            compacted = False
+            prompt = _format_prompt(delta, user_input, emotion)
+            if self.turns > 0 and sent_tokens + _count_tokens(prompt) > self.context_budget:
+                # Compact: new server-side conversation seeded with the recent transcript only
+                conversation_id = str(uuid.uuid4())
+                sent_tokens = 0
+                compacted = True
+                context = _tail_tokens(self._recent, self.carry_tokens)
+                prompt = _format_prompt(delta, user_input, emotion, context=context)
+
+            result = get_scheduler("airia").call(
+                None, _post_query, prompt, self.user_id, conversation_id,
+                priority=self.priority if priority is None else priority
+            )
+
+            # The turn went through: commit the session state
+            self.conversation_id = conversation_id
+            self.compactions += compacted
+            self.turns += 1
+            self._sent_tokens = sent_tokens + _count_tokens(prompt)
+            self._recent = _tail_tokens(f"{self._recent} {delta}", self.carry_tokens)
+            if self.running_transcript:
+                self._seen_len = len(convo_txt)
+                self._seen_tail = convo_txt[-_TAIL_CHARS:]
+            return result
+
+    def reset(self):
+        """Start a new conversation with no history."""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.conversation_id = str(uuid.uuid4())
+        self.turns = 0
+        self.compactions = 0
+        self._seen_len = 0  # length of the running transcript already sent
+        self._seen_tail = ""  # its last characters, to check the next transcript extends it
+        self._recent = ""  # tail of the transcript, kept for compaction
+        self._sent_tokens = 0  # tokens sent in the current server-side conversation
+
+
 # === Example use ===
 if __name__ == "__main__":
     result = queryAIRIA(
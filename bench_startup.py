@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Startup benchmark for the Lumo entry points.
+
+Times cold imports and `--help` runs in fresh interpreters so regressions in
+import-time cost (e.g. a heavy dependency creeping back to module level) show up.
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --repeat 5 --max-seconds 1.0
+    python bench_startup.py --importtime main_process
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (name, command, expected exit code)
+CASES = [
+    ("import MER", [sys.executable, "-c", "import MER"], 0),
+    ("import textTotext", [sys.executable, "-c", "import textTotext"], 0),
+    ("import main_process", [sys.executable, "-c", "import main_process"], 0),
+    ("textTotext.py --help", [sys.executable, "textTotext.py", "--help"], 0),
+    ("main_process.py --help", [sys.executable, "main_process.py", "--help"], 0),
+    ("main_process.py <missing video>", [sys.executable, "main_process.py", "does-not-exist.mp4"], 1),
+]
+
+
+def _time_command(cmd, repeat: int, expected_returncode: int = 0):
+    """Run cmd `repeat` times in a fresh interpreter.
+
+    Returns:
+        (wall-clock timings in seconds, None) if every run exited with
+        expected_returncode, else (timings, (returncode, stderr)) for the first run that did not.
+    """
+    timings = []
+    mismatch = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        timings.append(time.perf_counter() - start)
+        if proc.returncode != expected_returncode and mismatch is None:
+            mismatch = (proc.returncode, proc.stderr)
+    return timings, mismatch
+
+
+def _print_importtime(module: str, top: int):
+    """Print the `top` most expensive imports (cumulative) reported by `python -X importtime`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # Format: "import time:  <self us> | <cumulative us> | <indented module name>"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    print(f"\nTop {top} imports by cumulative time for 'import {module}':")
+    for cumulative_us, self_us, name in rows[:top]:
+        print(f"  {cumulative_us / 1000:9.1f} ms  (self {self_us / 1000:7.1f} ms)  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold-start time of the Lumo entry points")
+    parser.add_argument("--repeat", "-r", type=int, default=3, help="Runs per case (default: 3)")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Exit non-zero if any case's median exceeds this many seconds")
+    parser.add_argument("--importtime", metavar="MODULE", default=None,
+                        help="Also show the slowest imports for MODULE via -X importtime")
+    parser.add_argument("--top", type=int, default=15, help="Rows to show with --importtime (default: 15)")
+    args = parser.parse_args()
+
+    baseline_timings, _ = _time_command([sys.executable, "-c", "pass"], args.repeat)
+    baseline = statistics.median(baseline_timings)
+    print(f"{'case':<36} {'median':>9} {'min':>9} {'max':>9}")
+    print(f"{'python -c pass (baseline)':<36} {baseline:9.3f} {'':>9} {'':>9}")
+
+    broken = []
+    failed = []
+    for name, cmd, expected in CASES:
+        timings, mismatch = _time_command(cmd, args.repeat, expected)
+        if mismatch is not None:
+            # A crash (e.g. an import error) is fast but not a pass
+            returncode, stderr = mismatch
+            print(f"{name:<36} {'FAILED':>9}  exit {returncode}, expected {expected}")
+            broken.append((name, stderr))
+            continue
+        median = statistics.median(timings)
+        print(f"{name:<36} {median:9.3f} {min(timings):9.3f} {max(timings):9.3f}")
+        if args.max_seconds is not None and median > args.max_seconds:
+            failed.append(name)
+
+    if args.importtime:
+        _print_importtime(args.importtime, args.top)
+
+    for name, stderr in broken:
+        print(f"\n--- {name} stderr ---\n{stderr.rstrip()}", file=sys.stderr)
+    if failed:
+        print(f"\nOver budget ({args.max_seconds:.3f}s): {', '.join(failed)}", file=sys.stderr)
+    return 1 if broken or failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Memory-mapped face-crop store for re-scoring videos without re-decoding.
+
+`extract` decodes each video once with the same ingest and face detection as
+process_video (ffmpeg fps sampling, frames downscaled to 640px wide) and writes
+every sampled 80x80 crop, its timestamp and its face box to one compact file per
+video. Scores from a store therefore match process_video, not predict_from_video,
+which samples full-resolution frames with OpenCV. `score` then runs MERCnnModel straight from
+those files in large batches, so evaluating new weights is pure inference.
+
+File layout: a 16-byte header (magic, version, crop size) followed by
+fixed-size records of CROP_DTYPE, read back with numpy.memmap.
+
+Usage:
+    python cropStore.py extract videos/*.mp4 --out-dir crops/
+    python cropStore.py score crops/*.crops --weights MERCnn_v2.pth --batch-size 512
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+from typing import Optional
+
+import numpy as np
+
+MAGIC = b"LUMOCROP"
+VERSION = 1
+HEADER = struct.Struct("<8sII")  # magic, version, crop size
+CROP_SIZE = 80
+
+
+def crop_dtype(size: int = CROP_SIZE) -> np.dtype:
+    """Record layout: timestamp (s), face box x/y/w/h (all -1 if no face was found), BGR crop."""
+    return np.dtype([
+        ("timestamp", "<f8"),
+        ("box", "<i4", (4,)),
+        ("crop", "u1", (size, size, 3)),
+    ])
+
+
+CROP_DTYPE = crop_dtype()
+
+
+def default_store_path(video_path: str, out_dir: Optional[str] = None) -> str:
+    base = os.path.splitext(os.path.basename(video_path))[0] + ".crops"
+    return os.path.join(out_dir or os.path.dirname(video_path), base)
+
+
+def extract_crops(video_path: str, store_path: Optional[str] = None, fps: float = 2,
+                  max_width: int = 640, chunk_size: int = 256) -> str:
+    """Decode a video once and write its sampled face crops to a crop store.
+
+    Frames come from VideoIngest, as in process_video.
+
+    Args:
+        video_path: Path to the video file.
+        store_path: Output path (defaults to <video name>.crops next to the video).
+        fps: Frames per second sampled by ffmpeg.
+        max_width: Frames are downscaled to this width before detection, as in process_video.
+        chunk_size: Records buffered in memory before each write.
+
+    Returns:
+        The path of the written store.
+
+    Raises:
+        FileNotFoundError: If the video does not exist.
+        ValueError: If the video cannot be opened.
+    """
+    import cv2
+    import MER
+    from videoIngest import VideoIngest
+
+    if not os.path.isfile(video_path):
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+
+    if store_path is None:
+        store_path = default_store_path(video_path)
+    tmp_path = store_path + ".tmp"
+
+    chunk = np.zeros(chunk_size, dtype=CROP_DTYPE)
+    count = 0
+    ingest = VideoIngest(video_path, fps=fps, max_width=max_width)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, CROP_SIZE))
+            for timestamp, frame in ingest.frames():
+                bboxes = MER.faceBox(frame)
+                face, box = frame, (-1, -1, -1, -1)
+                if bboxes:
+                    x, y, w, h = bboxes[0]  # only first face, like predict_from_frames
+                    face = frame[max(y, 0):y+h, max(x, 0):x+w]
+                    box = (x, y, w, h)
+                if face.size == 0:
+                    continue
+
+                chunk["timestamp"][count] = timestamp
+                chunk["box"][count] = box
+                cv2.resize(face, (CROP_SIZE, CROP_SIZE), dst=chunk["crop"][count])
+                count += 1
+                if count == chunk_size:
+                    f.write(chunk.tobytes())
+                    count = 0
+            f.write(chunk[:count].tobytes())
+        ingest.close()
+    except BaseException:
+        ingest.abort()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, store_path)
+    return store_path
+
+
+def open_store(store_path: str) -> np.memmap:
+    """Memory-map a crop store read-only as a 1-D array of CROP_DTYPE records.
+
+    Raises:
+        ValueError: If the file is not a crop store.
+    """
+    with open(store_path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError(f"Not a crop store: {store_path}")
+    magic, version, size = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a crop store (or unsupported version): {store_path}")
+
+    dtype = crop_dtype(size)
+    count = (os.path.getsize(store_path) - HEADER.size) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(store_path, dtype=dtype, mode="r", offset=HEADER.size, shape=(count,))
+
+
+def score_store(store_path: str, weights_path: Optional[str] = None, batch_size: int = 256,
+                return_probs: bool = False):
+    """Run MERCnnModel over every crop in a store.
+
+    Returns:
+        (dominant emotion, counts per emotion), plus an N x classes probability
+        array in crop order when return_probs is True.
+    """
+    import MER
+    import textTotext
+
+    store = open_store(store_path)
+    model, device = textTotext.get_model(weights_path)
+
+    label_counts = [0] * len(textTotext.EMOTIONS)
+    probs_out = [] if return_probs else None
+    size = store.dtype["crop"].shape[0]
+    buffer = MER.FaceCropBuffer(capacity=max(int(batch_size), 1), size=size)
+
+    for start in range(0, len(store), buffer.capacity):
+        buffer.add_crops(store["crop"][start:start + buffer.capacity])
+        predictions, probs = MER.predict_batch(buffer.to_tensor(), model, device)
+        buffer.clear()
+        for prediction in predictions:
+            label_counts[textTotext.EMOTIONS.index(prediction)] += 1
+        if probs_out is not None:
+            probs_out.append(probs.numpy())
+
+    max_idx = max(range(len(label_counts)), key=lambda i: label_counts[i])
+    result = (textTotext.EMOTIONS[max_idx], label_counts)
+    if return_probs:
+        probs_array = np.concatenate(probs_out) if probs_out else np.zeros((0, 0), dtype=np.float32)
+        result += (probs_array,)
+    return result
+
+
+def _cli(argv):
+    parser = argparse.ArgumentParser(description="Extract face crops once, then re-score them from disk")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    extract = sub.add_parser("extract", help="Decode videos and write their face crops to .crops files")
+    extract.add_argument("videos", nargs="+", help="Video files")
+    extract.add_argument("--out-dir", "-o", default=None, help="Directory for .crops files (default: next to each video)")
+    extract.add_argument("--fps", type=float, default=2, help="Frames per second to sample (default: 2)")
+
+    score = sub.add_parser("score", help="Run the MER model over .crops files")
+    score.add_argument("stores", nargs="+", help=".crops files")
+    score.add_argument("--weights", "-w", default=None, help="Path to MER weights (defaults to MERCnn.pth)")
+    score.add_argument("--batch-size", "-b", type=int, default=256, help="Crops per forward pass (default: 256)")
+
+    args = parser.parse_args(argv)
+
+    failures = 0
+    if args.command == "extract":
+        if args.out_dir:
+            os.makedirs(args.out_dir, exist_ok=True)
+        for video in args.videos:
+            try:
+                path = extract_crops(video, default_store_path(video, args.out_dir), fps=args.fps)
+                print(f"{video} -> {path} ({len(open_store(path))} crops)")
+            except Exception as e:
+                print(f"Error: {video}: {e}", file=sys.stderr)
+                failures += 1
+    else:
+        import textTotext
+
+        for store in args.stores:
+            try:
+                emotion, counts = score_store(store, args.weights, batch_size=args.batch_size)
+                print(json.dumps({
+                    "store": store,
+                    "emotion": emotion,
+                    "counts": dict(zip(textTotext.EMOTIONS, counts)),
+                }))
+            except Exception as e:
+                print(f"Error: {store}: {e}", file=sys.stderr)
+                failures += 1
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_cli(sys.argv[1:]))
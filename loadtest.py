@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""Offline load test for process_video.
+
+Starts local stand-in servers for the AIRIA PipelineExecution and Hume TTS
+endpoints (with configurable latency and error injection), points the real
+pipeline at them, and drives process_video at a fixed concurrency or arrival
+rate. Reports throughput, end-to-end and per-stage latency percentiles, errors,
+scheduler queue waits and peak RSS.
+
+Speech recognition uses the offline 'sphinx' engine by default (needs
+pocketsphinx), so no network access is required. The emotion model weights
+(MERCnn.pth) and ffmpeg must be available as for a normal run.
+
+Usage:
+    python loadtest.py sample.mp4 --concurrency 10 --jobs 50
+    python loadtest.py sample.mp4 --rate 2 --duration 60 --airia-latency 1.5 --error-rate 0.05
+    python loadtest.py --serve-only   # just run the mock servers
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A few bytes that start like an MP3 frame; the pipeline only writes them to disk
+FAKE_MP3 = b"\xff\xfb\x90\x64" + bytes(412)
+
+MOCK_RESPONSES = [
+    "I'd like some fruit instead, please.",
+    "Not chicken today, thank you.",
+    "Could I have something lighter?",
+]
+
+
+class MockConfig:
+    """Latency (seconds, mean with +/-jitter fraction) and error injection for one mock API."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.2, error_rate: float = 0.0,
+                 error_status: int = 500):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if self.latency > 0:
+            time.sleep(max(0.0, self.latency * (1 + random.uniform(-self.jitter, self.jitter))))
+
+    def should_fail(self) -> bool:
+        failed = random.random() < self.error_rate
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+        return failed
+
+
+def _make_handler(airia: MockConfig, hume: MockConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass  # keep load-test output readable
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_POST(self):
+            body = self._read_json()
+            if re.fullmatch(r"/v2/PipelineExecution/[^/]+", self.path):
+                self._airia(body)
+            elif self.path == "/v0/tts":
+                self._hume(body)
+            elif self.path == "/v0/tts/stream/json":
+                self._hume_stream(body)
+            else:
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+
+        def _airia(self, body):
+            airia.delay()
+            if airia.should_fail():
+                self._send_json(airia.error_status, {"error": "injected failure"})
+                return
+            # Tag replies with a digest of the prompt so distinct jobs get distinct TTS texts
+            digest = hashlib.sha1(str(body.get("userInput", "")).encode()).hexdigest()[:8]
+            result = json.dumps({"responses": [f"{text} ({digest})" for text in MOCK_RESPONSES]})
+            self._send_json(200, {"result": result})
+
+        def _hume(self, body):
+            hume.delay()
+            if hume.should_fail():
+                self._send_json(hume.error_status, {"error": "injected failure"})
+                return
+            utterances = body.get("utterances", [])
+            audio = base64.b64encode(FAKE_MP3).decode()
+            snippets = [{"audio": audio, "utterance_index": i, "text": u.get("text", "")}
+                        for i, u in enumerate(utterances)]
+            self._send_json(200, {"generations": [{
+                "audio": base64.b64encode(FAKE_MP3 * max(len(utterances), 1)).decode(),
+                "snippets": [snippets],
+            }]})
+
+        def _hume_stream(self, body):
+            if hume.should_fail():
+                hume.delay()
+                self._send_json(hume.error_status, {"error": "injected failure"})
+                return
+            chunks = 4
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for index in range(chunks):
+                time.sleep(hume.latency / chunks)
+                line = json.dumps({"audio": base64.b64encode(FAKE_MP3).decode(),
+                                   "chunk_index": index, "is_last_chunk": index == chunks - 1}) + "\n"
+                data = line.encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def start_mock_server(airia: MockConfig, hume: MockConfig, host: str = "127.0.0.1", port: int = 0):
+    """Serve both mock APIs from one local HTTP server; returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), _make_handler(airia, hume))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_load(video_path: str, concurrency: int = 10, jobs: int = None, rate: float = None,
+             duration: float = None, asr_engine: str = "sphinx", user_input: str = "No, I want fruit.",
+             shared_input: bool = False) -> dict:
+    """Drive process_video and collect latencies.
+
+    Closed loop: `jobs` jobs with at most `concurrency` in flight.
+    Open loop: Poisson arrivals at `rate` jobs/second for `duration` seconds
+    (concurrency then only caps the worker threads).
+
+    Each job gets a distinct user_input (and so distinct AIRIA and Hume requests), so
+    the schedulers cannot coalesce jobs into one upstream call. Pass shared_input=True
+    to send identical requests and measure deduplication instead.
+    """
+    from main_process import process_video
+    from requestScheduler import BATCH, get_scheduler
+
+    coalesced_before = {name: get_scheduler(name).stats()["coalesced"] for name in ("airia", "hume")}
+
+    results = []
+    results_lock = threading.Lock()
+    work_root = tempfile.mkdtemp(prefix="lumo-loadtest-")
+
+    def job(index, scheduled_at):
+        output_dir = os.path.join(work_root, f"job-{index}")
+        os.makedirs(output_dir)
+        timings = {}
+        error = None
+        try:
+            job_input = user_input if shared_input else f"{user_input} [{index}]"
+            process_video(video_path, job_input, priority=BATCH, output_dir=output_dir,
+                          asr_engine=asr_engine, timings=timings)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finished = time.perf_counter()
+        with results_lock:
+            results.append({
+                "latency": finished - scheduled_at,  # includes time spent waiting for a worker
+                "timings": timings,
+                "error": error,
+                "finished": finished,
+            })
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if rate:
+            index = 0
+            next_at = started
+            while next_at - started < duration:
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+                pool.submit(job, index, next_at)
+                index += 1
+                next_at += random.expovariate(rate)
+        else:
+            for index in range(jobs):
+                pool.submit(job, index, time.perf_counter())
+    elapsed = time.perf_counter() - started
+    shutil.rmtree(work_root, ignore_errors=True)
+
+    ok = [r for r in results if r["error"] is None]
+    stages = {}
+    for r in ok:
+        for stage, seconds in r["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+
+    def summary(samples):
+        return {
+            "p50": _percentile(samples, 50),
+            "p95": _percentile(samples, 95),
+            "p99": _percentile(samples, 99),
+            "mean": statistics.fmean(samples) if samples else float("nan"),
+        }
+
+    errors = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+    return {
+        "jobs": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "elapsed": elapsed,
+        "throughput": len(ok) / elapsed if elapsed else 0.0,
+        "latency": summary([r["latency"] for r in ok]),
+        "stages": {stage: summary(samples) for stage, samples in stages.items()},
+        "errors": errors,
+        "peak_rss_mb": _peak_rss_mb(),
+        "coalesced": {name: get_scheduler(name).stats()["coalesced"] - before
+                      for name, before in coalesced_before.items()},
+    }
+
+
+def _print_report(report: dict, airia: MockConfig, hume: MockConfig, scheduler_stats):
+    print(f"\njobs: {report['jobs']}  ok: {report['succeeded']}  failed: {report['failed']}  "
+          f"elapsed: {report['elapsed']:.1f}s  throughput: {report['throughput']:.2f} jobs/s")
+    print(f"peak RSS: {report['peak_rss_mb']:.0f} MB")
+    print(f"coalesced upstream calls: AIRIA {report['coalesced']['airia']}, Hume {report['coalesced']['hume']}"
+          f"{'' if any(report['coalesced'].values()) else ' (every job hit the mock servers)'}")
+    print(f"\n{'stage':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'mean':>8}")
+    rows = [("end-to-end", report["latency"])] + sorted(report["stages"].items())
+    for name, s in rows:
+        print(f"{name:<12} {s['p50']:8.3f} {s['p95']:8.3f} {s['p99']:8.3f} {s['mean']:8.3f}")
+    print(f"\nmock AIRIA: {airia.requests} requests, {airia.errors} injected errors")
+    print(f"mock Hume:  {hume.requests} requests, {hume.errors} injected errors")
+    for stats in scheduler_stats:
+        waits = stats["queue_wait"].get("batch", {})
+        print(f"{stats['name']} scheduler: {stats['completed']} completed, {stats['coalesced']} coalesced, "
+              f"queue wait p50 {waits.get('p50', 0):.3f}s p95 {waits.get('p95', 0):.3f}s")
+    for error, count in sorted(report["errors"].items(), key=lambda item: -item[1])[:5]:
+        print(f"  {count} x {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for process_video with mock AIRIA/Hume servers")
+    parser.add_argument("video", nargs="?", help="Video file to process in every job")
+    parser.add_argument("--concurrency", "-c", type=int, default=10, help="Jobs in flight (default: 10)")
+    parser.add_argument("--jobs", "-n", type=int, default=None, help="Total jobs, closed loop (default: 5 x concurrency)")
+    parser.add_argument("--rate", type=float, default=None, help="Open loop: job arrivals per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=30, help="Open loop: seconds to keep arriving (default: 30)")
+    parser.add_argument("--asr-engine", choices=["sphinx", "google"], default="sphinx",
+                        help="Speech recognition engine; 'sphinx' keeps the run offline (default)")
+    parser.add_argument("--airia-latency", type=float, default=1.0, help="Mock AIRIA latency in seconds (default: 1.0)")
+    parser.add_argument("--hume-latency", type=float, default=0.5, help="Mock Hume latency in seconds (default: 0.5)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency jitter as a fraction (default: 0.2)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock requests that fail (default: 0)")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status for injected failures (default: 500)")
+    parser.add_argument("--airia-rate", type=float, default=None, help="Override the AIRIA scheduler rate limit (req/s)")
+    parser.add_argument("--hume-rate", type=float, default=None, help="Override the Hume scheduler rate limit (req/s)")
+    parser.add_argument("--port", type=int, default=0, help="Mock server port (default: any free port)")
+    parser.add_argument("--serve-only", action="store_true", help="Only run the mock servers until interrupted")
+    parser.add_argument("--shared-input", action="store_true",
+                        help="Give every job the same input so identical requests coalesce (measures dedup, not upstream load)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if not args.serve_only and not args.video:
+        parser.error("a video path is required unless --serve-only is given")
+    if args.video and not os.path.isfile(args.video):
+        parser.error(f"video file not found: {args.video}")
+
+    airia = MockConfig(args.airia_latency, args.jitter, args.error_rate, args.error_status)
+    hume = MockConfig(args.hume_latency, args.jitter, args.error_rate, args.error_status)
+    server, base_url = start_mock_server(airia, hume, port=args.port)
+    print(f"Mock AIRIA/Hume server listening on {base_url}", file=sys.stderr)
+
+    if args.serve_only:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        server.shutdown()
+        return 0
+
+    # Must be set before the API modules are imported (they read these at import time)
+    os.environ["AIRIA_BASE_URL"] = base_url
+    os.environ["HUME_BASE_URL"] = base_url
+    os.environ["HUME_API_KEY"] = os.environ.get("HUME_API_KEY") or "loadtest"
+
+    from requestScheduler import configure_scheduler, get_scheduler
+    if args.airia_rate is not None:
+        configure_scheduler("airia", rate=args.airia_rate, burst=max(args.airia_rate, 1))
+    if args.hume_rate is not None:
+        configure_scheduler("hume", rate=args.hume_rate, burst=max(args.hume_rate, 1))
+
+    import main_process
+    main_process.preload()
+
+    report = run_load(args.video, concurrency=args.concurrency,
+                      jobs=args.jobs or 5 * args.concurrency,
+                      rate=args.rate, duration=args.duration, asr_engine=args.asr_engine,
+                      shared_input=args.shared_input)
+    scheduler_stats = [get_scheduler("airia").stats(), get_scheduler("hume").stats()]
+    server.shutdown()
+
+    if args.json:
+        report["mock"] = {"airia": {"requests": airia.requests, "errors": airia.errors},
+                          "hume": {"requests": hume.requests, "errors": hume.errors}}
+        report["schedulers"] = scheduler_stats
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report, airia, hume, scheduler_stats)
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,107 +1,159 @@
-import cv2
 import json
 import os
 import sys
-import numpy as np
-from airia_trial import queryAIRIA
+import time
+from typing import Optional
+
 import textTotext
-import subprocess
+from requestScheduler import INTERACTIVE
+
+# Heavy dependencies (cv2, torch, mediapipe, MER) are imported inside the functions
+# that need them so argument parsing and path validation stay fast; textTotext itself
+# defers those imports, so importing it here is cheap.
+
+
+def preload(weights_path: Optional[str] = None):
+    """Load the emotion model, face detector and API clients up front for long-running use."""
+    import airia_trial  # noqa: F401
+    import textTospeech  # noqa: F401
+
+    textTotext.preload(weights_path)
 
-def process_video(video_path: str, user_input: str):
+
+def _check_video_path(video_path: str):
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+    
+    if not os.path.isfile(video_path):
+        raise ValueError(f"Not a file: {video_path}")
+
+
+def process_video(video_path: str, user_input: str, priority: int = INTERACTIVE,
+                  output_dir: str = ".", asr_engine: str = "google", timings: Optional[dict] = None,
+                  session=None, gate_threshold: Optional[float] = textTotext.DEFAULT_GATE_THRESHOLD):
     """
     Process a video file to extract emotion, transcribe audio, and get AI response.
     
     Args:
         video_path (str): Path to the MP4 file
         user_input (str): User's input text
+        priority (int): Scheduler lane for the AIRIA/Hume calls (requestScheduler.INTERACTIVE or BATCH)
+        output_dir (str): Directory for data.json, the temporary WAV and the response MP3s
+        asr_engine (str): Speech recognition engine passed to audio_to_text ('google' or offline 'sphinx')
+        timings (dict, optional): If given, filled with seconds spent per stage
+            (emotion, audio, transcribe, airia, tts, total)
+        session (airia_trial.AiriaSession, optional): Ongoing conversation to continue; this
+            video's transcript is sent as the new turn (use a session with the default
+            running_transcript=False). Without it every call is a fresh AIRIA conversation.
+        gate_threshold (float, optional): Reuse the previous emotion prediction for face crops
+            that differ by at most this much (0-1, see MER.PredictionGate). None runs the
+            model on every sampled crop.
         
     Returns:
-        dict: Dictionary containing emotion, transcribed text, AI response, and audio file paths
+        dict: Dictionary containing emotion, transcribed text, AI response, audio file paths and
+            gate_skip_rate (fraction of sampled face crops that reused a cached prediction,
+            None when gate_threshold is None)
     
     Raises:
         FileNotFoundError: If video file doesn't exist
         ValueError: If video file is invalid
+        RuntimeError: If ffmpeg/ffprobe are not installed or the audio cannot be extracted
     """
-    if not os.path.exists(video_path):
-        raise FileNotFoundError(f"Video file not found: {video_path}")
-    
-    if not os.path.isfile(video_path):
-        raise ValueError(f"Not a file: {video_path}")
-        
-    # Check if it's a video file
-    video = cv2.VideoCapture(video_path)
-    if not video.isOpened():
-        video.release()
-        raise ValueError(f"Could not open video file: {video_path}")
-    # 1. Process video for emotion using the built-in video processing
-    emotion, counts = textTotext.predict_from_video(
-        video_source=video_path,
-        show_window=False  # Don't show the video window while processing
-    )
-    dominant_emotion = emotion  # This is already the dominant emotion
+    _check_video_path(video_path)
         
-    # Save emotion to data.json
-    with open('data.json', 'r+') as f:
-        data = json.load(f)
-        data['emotion'] = dominant_emotion
-        f.seek(0)
-        json.dump(data, f, indent=4)
-        f.truncate()
-    
-    # 2. Extract audio from video using ffmpeg
-    temp_audio = "temp_video_audio.wav"
+    import MER
+    from airia_trial import queryAIRIA
+    from videoIngest import VideoIngest
+
+    if timings is None:
+        timings = {}
+    started = stage_start = time.perf_counter()
+
+    def end_stage(name):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[name] = now - stage_start
+        stage_start = now
+
+    def output_path(name):
+        return os.path.normpath(os.path.join(output_dir, name))
+
+    # Demux and decode the file once: ffmpeg feeds sampled frames to the emotion
+    # model and writes the audio track to a WAV for transcription in the same pass
+    temp_audio = output_path("temp_video_audio.wav")
+    ingest = VideoIngest(video_path, fps=2, wav_path=temp_audio)  # ValueError if not a video
     try:
-        # Extract audio from video
-        subprocess.run([
-            'ffmpeg', '-i', video_path,
-            '-vn',  # No video
-            '-acodec', 'pcm_s16le',  # PCM format
-            '-ar', '44100',  # Sample rate
-            '-ac', '2',  # Stereo
-            '-y',  # Overwrite output file
-            temp_audio
-        ], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error extracting audio: {e}")
-        raise RuntimeError("Failed to extract audio from video")
-
-    # 3. Process audio to text using audioToText
-    from audioToText import audio_to_text
-    transcribed_text = audio_to_text(temp_audio)
-    
-    # Clean up temporary audio file
-    if os.path.exists(temp_audio):
-        os.remove(temp_audio)
+        # 1. Process video frames for emotion
+        gate = MER.PredictionGate(threshold=gate_threshold) if gate_threshold is not None else None
+        emotion, counts = textTotext.predict_from_frames(ingest.frames(), gate_threshold=None, gate=gate)
+        dominant_emotion = emotion  # This is already the dominant emotion
+            
+        # Save emotion to data.json
+        data_path = output_path('data.json')
+        data = {}
+        if os.path.isfile(data_path):
+            with open(data_path, 'r') as f:
+                data = json.load(f)
+        data['emotion'] = dominant_emotion
+        with open(data_path, 'w') as f:
+            json.dump(data, f, indent=4)
+        end_stage("emotion")
+        
+        # 2. Wait for the audio track written by the same ffmpeg process
+        try:
+            ingest.close()
+            if not ingest.has_audio:
+                raise RuntimeError("no audio stream in video")
+        except RuntimeError as e:
+            print(f"Error extracting audio: {e}")
+            raise RuntimeError("Failed to extract audio from video")
+        end_stage("audio")
+
+        # 3. Process audio to text using audioToText
+        from audioToText import audio_to_text
+        transcribed_text = audio_to_text(temp_audio, engine=asr_engine)
+    finally:
+        # Stop ffmpeg if we bailed out early (no-op after close) and clean up temporary audio file
+        ingest.abort()
+        if os.path.exists(temp_audio):
+            os.remove(temp_audio)
+    end_stage("transcribe")
 
     # Get AI response first so we can generate the audio files
-    airia_response = queryAIRIA(
-        convo_txt=transcribed_text,
-        user_input=user_input,
-        emotion=dominant_emotion
-    )
+    if session is not None:
+        airia_response = session.query(
+            convo_txt=transcribed_text,
+            user_input=user_input,
+            emotion=dominant_emotion,
+            priority=priority
+        )
+    else:
+        airia_response = queryAIRIA(
+            convo_txt=transcribed_text,
+            user_input=user_input,
+            emotion=dominant_emotion,
+            priority=priority
+        )
+    end_stage("airia")
 
-    # 4. Generate audio files using textTospeech.generate_speech for each response
-    from textTospeech import generate_speech
+    # 4. Generate audio files for all responses with one batched Hume request
+    from textTospeech import generate_speech_batch
 
-    audio_files = []
-    for idx, response in enumerate(airia_response.get("responses", [])):
-        output_file = f"response_{idx+1}.mp3"
-        try:
-            # Call the TTS function directly (passes text and detected emotion)
-            generate_speech(response, dominant_emotion, out_path=output_file)
-            audio_files.append(output_file)
-        except Exception as e:
-            # If TTS fails for this response, log and continue
-            print(f"Warning: TTS failed for response #{idx+1}: {e}", file=sys.stderr)
-            # create an empty placeholder file to keep indexing predictable
-            open(output_file, 'wb').close()
-            audio_files.append(output_file)
+    responses = airia_response.get("responses", [])
+    audio_files = generate_speech_batch(
+        responses, dominant_emotion,
+        out_paths=[output_path(f"response_{idx+1}.mp3") for idx in range(len(responses))],
+        priority=priority
+    )
+    end_stage("tts")
+    timings["total"] = time.perf_counter() - started
     
     return {
         "emotion": dominant_emotion,
         "transcribed_text": transcribed_text,
         "airia_response": airia_response,
-        "audio_files": audio_files
+        "audio_files": audio_files,
+        "gate_skip_rate": gate.skip_rate if gate is not None else None
     }
 
 if __name__ == "__main__":
@@ -110,11 +162,20 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process video for emotion and generate AI response")
     parser.add_argument("video", help="Path to the input video file")
     parser.add_argument("--input", "-i", default="", help="User input text")
+    parser.add_argument("--preload", action="store_true", help="Load the model and face detector before processing")
+    parser.add_argument("--gate-threshold", type=textTotext._unit_interval, default=textTotext.DEFAULT_GATE_THRESHOLD,
+                        help=f"Reuse the previous prediction when a crop differs by at most this much (0-1, default: {textTotext.DEFAULT_GATE_THRESHOLD})")
+    parser.add_argument("--no-gate", action="store_true", help="Run the emotion model on every sampled crop")
     
     args = parser.parse_args()
     
     try:
-        result = process_video(args.video, args.input)
+        # Fail fast on a bad path before --preload pulls in torch and mediapipe
+        _check_video_path(args.video)
+        if args.preload:
+            preload()
+        result = process_video(args.video, args.input,
+                               gate_threshold=None if args.no_gate else args.gate_threshold)
         print(json.dumps(result, indent=2))
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
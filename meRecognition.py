@@ -1,5 +1,4 @@
 import cv2
-import torchvision.transforms as transforms
 import torch
 import MER
 
@@ -20,24 +19,34 @@ if str(device) == 'cpu':
 if str(device) == 'gpu':
     model.load_state_dict(torch.load(w,map_location=torch.device('cuda'))) #for GPU
 
-transform = transforms.ToTensor()
+# reused across frames: the faces of a frame are resized into it and classified in batches
+crops = MER.FaceCropBuffer(capacity=8)
+
+def labelFaces(frame, boxes): # classify the crops staged in `crops` and draw their labels
+    predictions, _probs = MER.predict_batch(crops.to_tensor(), model, device)
+    crops.clear()
+    for (x,y,w,h), prediction in zip(boxes, predictions):
+        cv2.putText(frame,prediction,(x,y),cv2.FONT_HERSHEY_COMPLEX,1,(0,0,255))
 
 while True:
     _ , frame = cam.read()
     if _:
         bBox = MER.faceBox(frame)
         if len(bBox) > 0:
+            boxes = []
             for box in bBox:
                 x,y,w,h = box
                 cv2.rectangle(frame,(x,y),(x+w,y+h),(0,255,0),2)
-                faceExp = frame[y:y+h,x:x+w]
                 try: #sometime crashes due to corrupted/empty frame
-                    faceExpResized = cv2.resize(faceExp,(80,80))
-                except:
+                    crops.add(frame, box)
+                except Exception:
                     continue
-                faceExpResizedTensor = transform(faceExpResized)
-                prediction = MER.predict_image(faceExpResizedTensor, model, device)
-                cv2.putText(frame,prediction,(x,y),cv2.FONT_HERSHEY_COMPLEX,1,(0,0,255))
+                boxes.append(box)
+                if crops.full():
+                    labelFaces(frame, boxes)
+                    boxes = []
+            if boxes:
+                labelFaces(frame, boxes)
         cv2.imshow('MER', frame)
     if cv2.waitKey(1) & 0xff == ord('q'): # to quit the camera press 'q'
         print('end')
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Rate-limit-aware scheduler for upstream API calls (AIRIA, Hume).
+
+Each API gets one RequestScheduler that:
+
+- admits calls through a token bucket (rate requests/second, bursts up to `burst`)
+- runs interactive calls ahead of batch calls (priority lanes, FIFO within a lane)
+- coalesces identical in-flight calls: callers submitting the same key while a
+  call is queued or running share its result instead of issuing another request
+- records how long each call waited in the queue
+
+Usage:
+    from requestScheduler import get_scheduler, BATCH
+
+    scheduler = get_scheduler("airia")
+    result = scheduler.call(("query", text), do_request, text, priority=BATCH)
+    print(scheduler.stats())
+
+Rates come from <NAME>_RATE_LIMIT / <NAME>_BURST / <NAME>_CONCURRENCY
+environment variables (e.g. AIRIA_RATE_LIMIT=2) when a scheduler is first created.
+"""
+import heapq
+import itertools
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import Future
+
+INTERACTIVE = 0
+BATCH = 1
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it. A rate <= 0 means unlimited."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def refund(self):
+        """Return a token taken by acquire() that ended up unused."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+
+def _admitted():
+    return None
+
+
+class _Job:
+    __slots__ = ("key", "fn", "args", "kwargs", "future", "priority", "queued", "enqueued")
+
+    def __init__(self, key, fn, args, kwargs, priority):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.priority = priority
+        self.queued = True
+        self.enqueued = time.monotonic()
+
+
+class RequestScheduler:
+    """Priority queue + token bucket + in-flight deduplication in front of one API.
+
+    Args:
+        name: Label used in stats and worker thread names.
+        rate: Requests per second admitted upstream (<= 0 for unlimited).
+        burst: Requests that may be sent back to back after an idle period.
+        concurrency: Worker threads, i.e. maximum simultaneous upstream requests.
+        max_samples: Number of recent queue-wait samples kept per lane for stats.
+    """
+
+    def __init__(self, name: str, rate: float = 5, burst: float = 5, concurrency: int = 4,
+                 max_samples: int = 1000):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = max(int(concurrency), 1)
+        self.max_samples = max_samples
+
+        self._queue = []  # heap of (priority, seq, job)
+        self._seq = itertools.count()
+        self._inflight = {}  # key -> _Job shared by every caller of that key
+        self._cond = threading.Condition()
+        self._workers = []
+        self._closed = False
+
+        self._waits = {INTERACTIVE: [], BATCH: []}
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_workers(self):
+        # Called with self._cond held; workers start lazily so importing costs nothing
+        while len(self._workers) < self.concurrency:
+            worker = threading.Thread(target=self._run, name=f"{self.name}-scheduler-{len(self._workers)}",
+                                      daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, key, fn, *args, priority: int = INTERACTIVE, **kwargs) -> Future:
+        """Schedule fn(*args, **kwargs) and return a Future for its result.
+
+        If a call with an equal, hashable `key` is already queued or running, its
+        Future is returned instead and fn is not called again. Pass key=None to
+        opt out of deduplication. A coalesced call waiting in the batch lane is
+        promoted when an interactive caller joins it.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} scheduler is closed")
+            self.submitted += 1
+
+            job = self._inflight.get(key) if key is not None else None
+            if job is not None:
+                self.coalesced += 1
+                if job.queued and priority < job.priority:
+                    # Re-push at the higher priority; the old heap entry is skipped when popped
+                    job.priority = priority
+                    heapq.heappush(self._queue, (priority, next(self._seq), job))
+                    self._cond.notify()
+                return job.future
+
+            job = _Job(key, fn, args, kwargs, priority)
+            if key is not None:
+                self._inflight[key] = job
+            heapq.heappush(self._queue, (priority, next(self._seq), job))
+            self._ensure_workers()
+            self._cond.notify()
+            return job.future
+
+    def call(self, key, fn, *args, priority: int = INTERACTIVE, timeout: float = None, **kwargs):
+        """Like submit(), but block for and return the result (re-raising fn's exception)."""
+        return self.submit(key, fn, *args, priority=priority, **kwargs).result(timeout)
+
+    def admit(self, priority: int = INTERACTIVE, timeout: float = None):
+        """Wait for this caller's turn (priority lane and rate-limit token) without handing work over.
+
+        For calls the caller must run itself, such as consuming a response stream: the
+        upstream request then counts against the rate limit and lane order, but runs on
+        the caller's thread and does not hold a worker while it runs.
+        """
+        self.submit(None, _admitted, priority=priority).result(timeout)
+
+    def _pop(self):
+        # Called with self._cond held: highest-priority live job, or None
+        while self._queue:
+            _, _, job = heapq.heappop(self._queue)
+            if job.queued:  # otherwise a stale entry left behind by a priority promotion
+                job.queued = False
+                return job
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+
+            # Take the rate-limit token first and only then pick a job, so an interactive
+            # call that arrives while we wait still goes ahead of queued batch calls
+            self.bucket.acquire()
+            with self._cond:
+                job = self._pop()
+            if job is None:
+                self.bucket.refund()  # another worker took the work
+                continue
+
+            waited = time.monotonic() - job.enqueued
+            if not job.future.set_running_or_notify_cancel():
+                self._finish(job)
+                continue
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except BaseException as e:
+                self._finish(job, waited, failed=True)
+                job.future.set_exception(e)
+            else:
+                self._finish(job, waited)
+                job.future.set_result(result)
+
+    def _finish(self, job, waited=None, failed=False):
+        with self._cond:
+            if job.key is not None and self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            if waited is None:
+                return
+            samples = self._waits[INTERACTIVE if job.priority <= INTERACTIVE else BATCH]
+            samples.append(waited)
+            if len(samples) > self.max_samples:
+                del samples[:len(samples) - self.max_samples]
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def stats(self) -> dict:
+        """Counters plus queue-wait statistics (seconds) per priority lane."""
+        with self._cond:
+            lanes = {}
+            for priority, label in ((INTERACTIVE, "interactive"), (BATCH, "batch")):
+                samples = sorted(self._waits[priority])
+                if samples:
+                    lanes[label] = {
+                        "count": len(samples),
+                        "mean": statistics.fmean(samples),
+                        "p50": samples[len(samples) // 2],
+                        "p95": samples[min(int(len(samples) * 0.95), len(samples) - 1)],
+                        "max": samples[-1],
+                    }
+            return {
+                "name": self.name,
+                "queued": sum(1 for _, _, job in self._queue if job.queued),
+                "in_flight": len(self._inflight),
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "completed": self.completed,
+                "failed": self.failed,
+                "queue_wait": lanes,
+            }
+
+    def close(self):
+        """Stop accepting calls; workers exit once the queue is drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(name: str) -> RequestScheduler:
+    """Return the process-wide scheduler for an API, creating it from the environment on first use."""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(name)
+        if scheduler is None:
+            prefix = name.upper()
+            scheduler = RequestScheduler(
+                name,
+                rate=float(os.getenv(f"{prefix}_RATE_LIMIT", "5")),
+                burst=float(os.getenv(f"{prefix}_BURST", "5")),
+                concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", "4")),
+            )
+            _schedulers[name] = scheduler
+        return scheduler
+
+
+def configure_scheduler(name: str, **options) -> RequestScheduler:
+    """Replace the scheduler for an API (e.g. configure_scheduler("hume", rate=2, burst=2))."""
+    scheduler = RequestScheduler(name, **options)
+    with _schedulers_lock:
+        old, _schedulers[name] = _schedulers.get(name), scheduler
+    if old is not None:
+        old.close()
+    return scheduler
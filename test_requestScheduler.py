@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Tests for requestScheduler (stdlib only).
+
+Run with:
+    python -m unittest test_requestScheduler
+"""
+import threading
+import time
+import unittest
+
+from requestScheduler import BATCH, INTERACTIVE, RequestScheduler, TokenBucket
+
+
+class _Recorder:
+    """Records call order; `block()` occupies a worker until `release()`."""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self._lock = threading.Lock()
+
+    def block(self):
+        self.started.set()
+        self.gate.wait(5)
+        return "blocked"
+
+    def release(self):
+        self.gate.set()
+
+    def record(self, name):
+        with self._lock:
+            self.calls.append(name)
+        return name
+
+
+class RequestSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.recorder = _Recorder()
+
+    def _busy_scheduler(self, **options):
+        """A single-worker scheduler whose worker is held by a blocking call."""
+        scheduler = RequestScheduler("test", rate=0, concurrency=1, **options)
+        self.addCleanup(scheduler.close)
+        self.addCleanup(self.recorder.release)
+        blocker = scheduler.submit(None, self.recorder.block)
+        self.assertTrue(self.recorder.started.wait(5))
+        return scheduler, blocker
+
+    def test_interactive_lane_runs_before_batch(self):
+        scheduler, blocker = self._busy_scheduler()
+        futures = [
+            scheduler.submit(None, self.recorder.record, "batch-1", priority=BATCH),
+            scheduler.submit(None, self.recorder.record, "batch-2", priority=BATCH),
+            scheduler.submit(None, self.recorder.record, "interactive", priority=INTERACTIVE),
+        ]
+        self.recorder.release()
+        for future in [blocker] + futures:
+            future.result(5)
+        self.assertEqual(self.recorder.calls, ["interactive", "batch-1", "batch-2"])
+
+    def test_interactive_caller_promotes_coalesced_batch_call(self):
+        scheduler, blocker = self._busy_scheduler()
+        first = scheduler.submit("a", self.recorder.record, "a", priority=BATCH)
+        second = scheduler.submit("b", self.recorder.record, "b", priority=BATCH)
+        promoted = scheduler.submit("b", self.recorder.record, "b", priority=INTERACTIVE)
+        self.assertIs(promoted, second)
+
+        self.recorder.release()
+        for future in (blocker, first, second):
+            future.result(5)
+        self.assertEqual(self.recorder.calls, ["b", "a"])  # b ran once, ahead of a
+        stats = scheduler.stats()
+        self.assertEqual(stats["completed"], 3)
+        self.assertEqual(stats["queued"], 0)
+
+    def test_identical_in_flight_calls_are_coalesced(self):
+        scheduler, blocker = self._busy_scheduler()
+        futures = [scheduler.submit(("tts", "hi"), self.recorder.record, "hi") for _ in range(3)]
+        self.assertTrue(all(f is futures[0] for f in futures))
+
+        self.recorder.release()
+        self.assertEqual(futures[0].result(5), "hi")
+        blocker.result(5)
+        self.assertEqual(self.recorder.calls, ["hi"])
+        self.assertEqual(scheduler.stats()["coalesced"], 2)
+
+        # Once finished, the same key runs again
+        self.assertEqual(scheduler.call(("tts", "hi"), self.recorder.record, "hi", timeout=5), "hi")
+        self.assertEqual(self.recorder.calls, ["hi", "hi"])
+
+    def test_key_none_is_never_coalesced(self):
+        scheduler, blocker = self._busy_scheduler()
+        futures = [scheduler.submit(None, self.recorder.record, "x") for _ in range(2)]
+        self.assertIsNot(futures[0], futures[1])
+        self.recorder.release()
+        for future in [blocker] + futures:
+            future.result(5)
+        self.assertEqual(self.recorder.calls, ["x", "x"])
+
+    def test_exception_reaches_every_waiter_and_clears_key(self):
+        scheduler, blocker = self._busy_scheduler()
+
+        def fail():
+            raise ValueError("boom")
+
+        futures = [scheduler.submit("k", fail) for _ in range(2)]
+        self.recorder.release()
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(5)
+        blocker.result(5)
+        self.assertEqual(scheduler.stats()["failed"], 1)
+        self.assertEqual(scheduler.call("k", self.recorder.record, "ok", timeout=5), "ok")
+
+    def test_rate_limit_spaces_out_calls(self):
+        rate = 20
+        scheduler = RequestScheduler("test", rate=rate, burst=1, concurrency=4)
+        self.addCleanup(scheduler.close)
+        start = time.monotonic()
+        futures = [scheduler.submit(None, time.monotonic) for _ in range(6)]
+        times = sorted(f.result(5) for f in futures)
+        # One token up front, then one every 1/rate seconds
+        self.assertGreaterEqual(times[-1] - start, 5 / rate * 0.9)
+        self.assertEqual(scheduler.stats()["completed"], 6)
+
+    def test_admit_takes_a_token_without_running_work(self):
+        scheduler = RequestScheduler("test", rate=20, burst=1, concurrency=1)
+        self.addCleanup(scheduler.close)
+        start = time.monotonic()
+        scheduler.admit()
+        scheduler.admit(priority=BATCH)
+        self.assertGreaterEqual(time.monotonic() - start, 1 / 20 * 0.9)
+
+    def test_closed_scheduler_rejects_calls(self):
+        scheduler = RequestScheduler("test", rate=0)
+        scheduler.close()
+        with self.assertRaises(RuntimeError):
+            scheduler.submit(None, self.recorder.record, "x")
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_refill(self):
+        bucket = TokenBucket(rate=50, burst=3)
+        start = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.02)
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 1 / 50 * 0.9)
+
+    def test_refund_returns_a_token(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.acquire()
+        bucket.refund()
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
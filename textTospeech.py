@@ -1,58 +1,57 @@
 import os
+import sys
 import json
+import time
 import base64
 import requests
 from dotenv import load_dotenv
+
+from requestScheduler import INTERACTIVE, get_scheduler
 load_dotenv()
 
 # Do not raise on import; check API key inside the function so module can be imported safely.
 API_KEY = os.getenv("HUME_API_KEY")
 
+# Override to point at a local stand-in server (e.g. http://127.0.0.1:8000) for testing.
+HUME_BASE_URL = os.getenv("HUME_BASE_URL", "https://api.hume.ai").rstrip("/")
 
-def generate_speech(text: str, emotion: str, out_path: str = "recording.mp3") -> str:
-    """Generate emotional TTS using Hume API and save to out_path.
+# Define how to express each emotion
+EMOTION_PROMPTS = {
+    "anger": "Speak in a tense, forceful tone with sharp emphasis and intensity.",
+    "disgust": "Speak with clear distaste and aversion, as if repulsed by something unpleasant.",
+    "fear": "Speak in a trembling, cautious tone with hesitations, as if anxious or scared.",
+    "happiness": "Speak with a bright, cheerful tone full of energy and warmth.",
+    "neutral": "Speak in a calm, steady, and balanced tone without strong emotion.",
+    "sadness": "Speak slowly with a soft, low tone conveying sorrow or disappointment.",
+    "surprise": "Speak in an astonished tone, pitch rising with sudden realization or excitement."
+}
 
-    Args:
-        text: Text to synthesize.
-        emotion: Emotion label (anger, disgust, fear, happiness, neutral, sadness, surprise).
-        out_path: Path where the MP3 will be saved.
+# Select a voice (you can change this later)
+VOICE = {"name": "Ava Song", "provider": "HUME_AI"}
 
-    Returns:
-        The path to the saved audio file.
 
-    Raises:
-        RuntimeError: If HUME_API_KEY is not set or API call fails.
-        ValueError: If text or emotion are missing.
+def _build_request(text, emotion: str):
+    """Validate inputs and return the (payload, headers) pair for a Hume TTS call.
+
+    text may be a single string or a list of strings, one utterance each.
     """
     if not API_KEY:
         raise RuntimeError("Please set the HUME_API_KEY environment variable")
 
-    if not text or not emotion:
+    texts = [text] if isinstance(text, str) else list(text)
+    if not texts or not all(texts) or not emotion:
         raise ValueError("Both text and emotion must be provided")
 
-    # Define how to express each emotion
-    emotion_prompts = {
-        "anger": "Speak in a tense, forceful tone with sharp emphasis and intensity.",
-        "disgust": "Speak with clear distaste and aversion, as if repulsed by something unpleasant.",
-        "fear": "Speak in a trembling, cautious tone with hesitations, as if anxious or scared.",
-        "happiness": "Speak with a bright, cheerful tone full of energy and warmth.",
-        "neutral": "Speak in a calm, steady, and balanced tone without strong emotion.",
-        "sadness": "Speak slowly with a soft, low tone conveying sorrow or disappointment.",
-        "surprise": "Speak in an astonished tone, pitch rising with sudden realization or excitement."
-    }
-
-    acting_instruction = emotion_prompts.get(emotion, "Speak in a neutral tone.")
-
-    # Select a voice (you can change this later)
-    voice = {"name": "Ava Song", "provider": "HUME_AI"}
+    acting_instruction = EMOTION_PROMPTS.get(emotion, "Speak in a neutral tone.")
 
     payload = {
         "utterances": [
             {
-                "text": text,
-                "voice": voice,
+                "text": t,
+                "voice": VOICE,
                 "description": acting_instruction,
             }
+            for t in texts
         ]
     }
 
@@ -60,20 +59,210 @@ def generate_speech(text: str, emotion: str, out_path: str = "recording.mp3") ->
         "Content-Type": "application/json",
         "X-Hume-Api-Key": API_KEY
     }
+    return payload, headers
+
+
+def generate_speech(text: str, emotion: str, out_path: str = "recording.mp3", stream: bool = False,
+                    priority: int = INTERACTIVE) -> str:
+    """Generate emotional TTS using Hume API and save to out_path.
+
+    Args:
+        text: Text to synthesize.
+        emotion: Emotion label (anger, disgust, fear, happiness, neutral, sadness, surprise).
+        out_path: Path where the MP3 will be saved.
+        stream: If True, write audio chunks to out_path as they arrive (see stream_speech).
+        priority: requestScheduler lane (INTERACTIVE or BATCH) for the upstream call.
+
+    Returns:
+        The path to the saved audio file.
+
+    Raises:
+        RuntimeError: If HUME_API_KEY is not set or API call fails.
+        ValueError: If text or emotion are missing.
+    """
+    if stream:
+        return stream_speech(text, emotion, out_path=out_path, priority=priority)["out_path"]
+
+    _build_request(text, emotion)  # validate before queueing
+
+    # Rate limited through the "hume" scheduler; identical concurrent requests share one call
+    audio_bytes = get_scheduler("hume").call(("tts", text, emotion), _synthesize, text, emotion,
+                                             priority=priority)
+
+    with open(out_path, "wb") as f:
+        f.write(audio_bytes)
+
+    return out_path
+
 
-    url = "https://api.hume.ai/v0/tts"
+def _synthesize(text: str, emotion: str) -> bytes:
+    payload, headers = _build_request(text, emotion)
+
+    url = f"{HUME_BASE_URL}/v0/tts"
     response = requests.post(url, json=payload, headers=headers)
     response.raise_for_status()
     result = response.json()
 
-    # Decode base64 audio and save it
+    # Decode base64 audio
     audio_b64 = result["generations"][0]["audio"]
-    audio_bytes = base64.b64decode(audio_b64)
+    return base64.b64decode(audio_b64)
 
-    with open(out_path, "wb") as f:
-        f.write(audio_bytes)
 
-    return out_path
+def generate_speech_batch(texts, emotion: str, out_paths=None, priority: int = INTERACTIVE) -> list:
+    """Synthesize several texts in a single Hume request and save one MP3 per text.
+
+    All texts go out as utterances of one request; the returned audio is split back
+    per utterance. Items the batch response left without audio are retried on their
+    own with generate_speech. If the batch request itself fails (e.g. Hume is rate
+    limiting or erroring) nothing is re-sent. Any item still without audio, including
+    empty texts, gets an empty placeholder file so indexing stays predictable.
+
+    Args:
+        texts: Texts to synthesize, in order.
+        emotion: Emotion label applied to every utterance.
+        out_paths: Output paths, one per text (default: response_1.mp3, response_2.mp3, ...).
+        priority: requestScheduler lane (INTERACTIVE or BATCH) for the upstream call.
+
+    Returns:
+        The list of output paths, one per text.
+    """
+    texts = list(texts)
+    if out_paths is None:
+        out_paths = [f"response_{idx+1}.mp3" for idx in range(len(texts))]
+    if len(out_paths) != len(texts):
+        raise ValueError("out_paths must have one entry per text")
+
+    audio = [None] * len(texts)
+    # Only items the batch response left without audio are re-sent one by one
+    retry = [False] * len(texts)
+    batch = [idx for idx, text in enumerate(texts) if text] if emotion else []
+    if batch:
+        batch_texts = tuple(texts[idx] for idx in batch)
+        try:
+            results = get_scheduler("hume").call(("tts-batch", batch_texts, emotion), _synthesize_batch,
+                                                 batch_texts, emotion, priority=priority)
+            for idx, audio_bytes in zip(batch, results):
+                audio[idx] = audio_bytes
+                retry[idx] = not audio_bytes
+        except Exception as e:
+            print(f"Warning: batched TTS failed, writing placeholders: {e}", file=sys.stderr)
+
+    for idx, (text, out_path) in enumerate(zip(texts, out_paths)):
+        if audio[idx]:
+            with open(out_path, "wb") as f:
+                f.write(audio[idx])
+            continue
+        if retry[idx]:
+            try:
+                generate_speech(text, emotion, out_path=out_path, priority=priority)
+                continue
+            except Exception as e:
+                # If TTS fails for this response, log and continue
+                print(f"Warning: TTS failed for response #{idx+1}: {e}", file=sys.stderr)
+        elif not text or not emotion:
+            print(f"Warning: TTS skipped for response #{idx+1}: text and emotion must be provided",
+                  file=sys.stderr)
+        # create an empty placeholder file to keep indexing predictable
+        open(out_path, 'wb').close()
+
+    return out_paths
+
+
+def _synthesize_batch(texts, emotion: str) -> list:
+    """One Hume request for several utterances; returns the audio bytes per utterance (None if missing)."""
+    payload, headers = _build_request(list(texts), emotion)
+
+    url = f"{HUME_BASE_URL}/v0/tts"
+    response = requests.post(url, json=payload, headers=headers)
+    response.raise_for_status()
+    generations = response.json().get("generations", [])
+
+    audio = [b""] * len(texts)
+    # Hume returns one generation per request, split into snippets tagged with their utterance
+    for generation in generations[:1]:
+        for group in generation.get("snippets", []):
+            for snippet in group:
+                idx = snippet.get("utterance_index")
+                if isinstance(idx, int) and 0 <= idx < len(texts) and snippet.get("audio"):
+                    audio[idx] += base64.b64decode(snippet["audio"])
+
+    if not any(audio) and len(texts) == 1 and generations and generations[0].get("audio"):
+        audio[0] = base64.b64decode(generations[0]["audio"])
+
+    return [a or None for a in audio]
+
+
+def stream_speech(text: str, emotion: str, out_path: str = "recording.mp3", sink=None, on_chunk=None,
+                  priority: int = INTERACTIVE) -> dict:
+    """Stream emotional TTS from Hume, writing audio progressively as chunks arrive.
+
+    Each line of the streaming response carries an independently decodable base64
+    audio chunk, so only one chunk is held in memory at a time and playback can
+    start before synthesis finishes.
+
+    Args:
+        text: Text to synthesize.
+        emotion: Emotion label (anger, disgust, fear, happiness, neutral, sadness, surprise).
+        out_path: Path where the MP3 will be written. Ignored when sink is given.
+        sink: Optional binary file-like object to write chunks to instead of out_path.
+        on_chunk: Optional callable invoked with each decoded chunk of bytes.
+        priority: requestScheduler lane (INTERACTIVE or BATCH). Streams wait for their turn
+            in the "hume" scheduler (lane order and rate limit) but are never coalesced, and
+            the stream itself is consumed on the calling thread, so sink writes and on_chunk
+            run there too and no scheduler worker is held for the stream's duration.
+
+    Returns:
+        dict with out_path (None when writing to a sink), ttfb (seconds until the first
+        audio chunk was decoded), elapsed (total seconds), bytes and chunks.
+
+    Raises:
+        RuntimeError: If HUME_API_KEY is not set or the stream contains no audio.
+        ValueError: If text or emotion are missing.
+    """
+    payload, headers = _build_request(text, emotion)  # validate before queueing
+    get_scheduler("hume").admit(priority)
+
+    url = f"{HUME_BASE_URL}/v0/tts/stream/json"
+    start = time.perf_counter()
+    ttfb = None
+    total_bytes = 0
+    chunks = 0
+
+    with requests.post(url, json=payload, headers=headers, stream=True) as response:
+        response.raise_for_status()
+        out = sink if sink is not None else open(out_path, "wb")
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                audio_b64 = chunk.get("audio")
+                if not audio_b64:
+                    continue
+                audio_bytes = base64.b64decode(audio_b64)
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                out.write(audio_bytes)
+                if hasattr(out, "flush"):
+                    out.flush()
+                if on_chunk is not None:
+                    on_chunk(audio_bytes)
+                total_bytes += len(audio_bytes)
+                chunks += 1
+        finally:
+            if sink is None:
+                out.close()
+
+    if chunks == 0:
+        raise RuntimeError("Hume TTS stream returned no audio")
+
+    return {
+        "out_path": out_path if sink is None else None,
+        "ttfb": ttfb,
+        "elapsed": time.perf_counter() - start,
+        "bytes": total_bytes,
+        "chunks": chunks,
+    }
 
 
 if __name__ == "__main__":
@@ -90,5 +279,10 @@ if __name__ == "__main__":
     if not text or not emotion:
         raise ValueError("Input JSON must include both 'text' and 'emotion' fields")
 
-    out = generate_speech(text, emotion, out_path="recording.mp3")
-    print(f"Saved emotional TTS to {out}")
\ No newline at end of file
+    if "--stream" in sys.argv[1:]:
+        stats = stream_speech(text, emotion, out_path="recording.mp3")
+        print(f"Streamed emotional TTS to {stats['out_path']} "
+              f"(first audio after {stats['ttfb']:.2f}s, total {stats['elapsed']:.2f}s)")
+    else:
+        out = generate_speech(text, emotion, out_path="recording.mp3")
+        print(f"Saved emotional TTS to {out}")
\ No newline at end of file
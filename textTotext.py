@@ -3,22 +3,31 @@ import argparse
 import os
 import sys
 import json
+import threading
 from typing import Optional
 
-import cv2
-import torch
-import torchvision.transforms as transforms
-
-import MER
+# cv2, torch and MER (which pulls in mediapipe) are imported on first use so that
+# --help, bad arguments and importing this module stay fast.
 
 EMOTIONS = ['anger', 'disgust', 'fear', 'happiness', 'neutral', 'sadness', 'surprise']
 
+# Loaded models keyed by (weights path, device) so long-running callers pay the load once
+_MODEL_CACHE = {}
+_MODEL_LOCK = threading.Lock()
+
+# Max mean absolute difference (0-1) between 16x16 grayscale crop thumbnails for a crop
+# to reuse the previous prediction; see MER.PredictionGate
+DEFAULT_GATE_THRESHOLD = 0.02
+
 
 def _get_default_weights_path() -> str:
     return os.path.join(os.path.dirname(__file__), "MERCnn.pth")
 
 
-def _load_model(weights_path: str, device: torch.device):
+def _load_model(weights_path: str, device: "torch.device"):
+    import torch
+    import MER
+
     if not os.path.isfile(weights_path):
         raise FileNotFoundError(f"Model weights not found at {weights_path!r}. Place 'MERCnn.pth' next to this file or pass --weights.")
 
@@ -29,46 +38,49 @@ def _load_model(weights_path: str, device: torch.device):
     return model
 
 
-def _prepare_tensor_from_frame(frame) -> torch.Tensor:
-    bboxes = MER.faceBox(frame)
-    if bboxes and len(bboxes) > 0:
-        x, y, w, h = bboxes[0]  # only first face
-        face = frame[y:y+h, x:x+w]
-    else:
-        face = frame
-
-    face_resized = cv2.resize(face, (80, 80))
-    transform = transforms.ToTensor()
-    tensor = transform(face_resized)
-    return tensor
-
-
-def predict_from_video(weights_path: Optional[str] = None, video_source=1, fps=2, show_window=True):
-    """Predict dominant emotion from a video source until 'q' is pressed or video ends."""
+def get_model(weights_path: Optional[str] = None):
+    """Return (model, device), loading the weights only the first time they are requested."""
+    import MER
 
     if weights_path is None:
         weights_path = _get_default_weights_path()
 
     device = MER.get_default_device()
-    model = _load_model(weights_path, device)
+    key = (os.path.abspath(weights_path), str(device))
+    with _MODEL_LOCK:
+        model = _MODEL_CACHE.get(key)
+        if model is None:
+            model = _load_model(weights_path, device)
+            _MODEL_CACHE[key] = model
+    return model, device
 
-    label_counts = [0] * len(EMOTIONS)
 
-    # Determine if source is a video file (string path) or webcam (integer)
-    is_file = isinstance(video_source, str) and os.path.isfile(video_source)
+def preload(weights_path: Optional[str] = None):
+    """Warm up heavy dependencies: import cv2/torch/mediapipe, load the model and build the face detector."""
+    import MER
 
-    cap = cv2.VideoCapture(video_source)
-    if not cap.isOpened():
-        raise RuntimeError(f"Could not open video source {video_source}")
+    get_model(weights_path)
+    MER.get_detector_pool().warm_up()
+
+
+def _first_face_box(frame):
+    import MER
+
+    bboxes = MER.faceBox(frame)
+    if bboxes and len(bboxes) > 0:
+        return bboxes[0]  # only first face
+    return None
+
+
+def _iter_sampled_frames(cap, fps, is_file):
+    """Yield (timestamp, frame) for every sampled frame read from an opened cv2.VideoCapture."""
+    import cv2
 
     # Compute frame interval
     original_fps = cap.get(cv2.CAP_PROP_FPS) or 30
     frame_interval = max(int(original_fps // fps), 1)
     frame_idx = 0
 
-    if not is_file:
-        print("Press 'q' in the window to stop measuring emotions and return result.")
-
     while True:
         ret, frame = cap.read()
 
@@ -80,31 +92,97 @@ def predict_from_video(weights_path: Optional[str] = None, video_source=1, fps=2
                 continue  # webcam → keep trying
 
         if frame_idx % frame_interval == 0:
-            try:
-                tensor = _prepare_tensor_from_frame(frame)
-                prediction = MER.predict_image(tensor, model, device)
-                idx = EMOTIONS.index(prediction)
-                label_counts[idx] += 1
-
-                if show_window:
-                    bboxes = MER.faceBox(frame)
-                    if bboxes:
-                        x, y, w, h = bboxes[0]
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                        cv2.putText(frame, prediction, (x, y-10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-                    cv2.imshow("MER Video", frame)
-
-                    if not is_file:  # only require 'q' for webcam
-                        if cv2.waitKey(1) & 0xFF == ord('q'):
-                            break
-
-            except Exception as e:
-                print(f"Skipping frame due to error: {e}", file=sys.stderr)
+            yield frame_idx / original_fps, frame
 
         frame_idx += 1
 
-    cap.release()
+
+def predict_from_frames(frames, weights_path: Optional[str] = None, batch_size=32,
+                        show_window=False, wait_for_quit=False,
+                        gate_threshold: Optional[float] = DEFAULT_GATE_THRESHOLD, gate=None):
+    """Predict dominant emotion from an iterable of already-sampled (timestamp, frame) pairs.
+
+    Sampled face crops are staged in a reused MER.FaceCropBuffer and classified
+    batch_size at a time; with show_window each frame is classified immediately
+    so its label can be drawn. With wait_for_quit, pressing 'q' stops early.
+
+    Crops that barely differ from the previous inferred crop reuse its prediction
+    (see MER.PredictionGate). Pass gate_threshold=None to disable this (0 still
+    skips exact duplicates), or pass your own gate to read its skip_rate afterwards.
+    """
+    import cv2
+    import MER
+
+    model, device = get_model(weights_path)
+
+    if gate is None and gate_threshold is not None:
+        gate = MER.PredictionGate(threshold=gate_threshold)
+
+    label_counts = [0] * len(EMOTIONS)
+    buffer = MER.FaceCropBuffer(capacity=1 if show_window else max(int(batch_size), 1))
+    pending = []  # GatedPrediction for each crop in the buffer, in slot order
+
+    def flush():
+        if len(buffer) == 0:
+            return []
+        try:
+            predictions, probs = MER.predict_batch(buffer.to_tensor(), model, device)
+        except Exception:
+            if gate is not None:
+                gate.reset()  # don't let later crops match predictions that never arrived
+            raise
+        finally:
+            buffer.clear()
+            entries = pending[:]
+            pending.clear()
+        for entry, prediction, prob in zip(entries, predictions, probs):
+            entry.label, entry.probs = prediction, prob
+            label_counts[EMOTIONS.index(prediction)] += 1 + entry.repeats
+        return predictions
+
+    for _timestamp, frame in frames:
+        try:
+            box = _first_face_box(frame)
+            slot = buffer.add(frame, box)
+
+            if gate is not None:
+                entry, hit = gate.match(0, buffer.images[slot])  # first face only → single track
+            else:
+                entry, hit = MER.GatedPrediction(), False
+
+            if hit:
+                buffer.drop_last()
+                if entry.label is None:
+                    entry.repeats += 1  # counted when the reference crop's batch is flushed
+                else:
+                    label_counts[EMOTIONS.index(entry.label)] += 1
+                prediction = entry.label
+            else:
+                pending.append(entry)
+                prediction = flush()[0] if show_window else None
+
+            if show_window:
+                if box is not None:
+                    x, y, w, h = box
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                    cv2.putText(frame, prediction, (x, y-10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+                cv2.imshow("MER Video", frame)
+
+                if wait_for_quit:  # only require 'q' for webcam
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+            elif buffer.full():
+                flush()
+
+        except Exception as e:
+            print(f"Skipping frame due to error: {e}", file=sys.stderr)
+
+    try:
+        flush()
+    except Exception as e:
+        print(f"Skipping final batch due to error: {e}", file=sys.stderr)
+
     if show_window:
         cv2.destroyAllWindows()
 
@@ -112,12 +190,55 @@ def predict_from_video(weights_path: Optional[str] = None, video_source=1, fps=2
     return EMOTIONS[max_idx], label_counts
 
 
+def predict_from_video(weights_path: Optional[str] = None, video_source=1, fps=2, show_window=True, batch_size=32,
+                       gate_threshold: Optional[float] = DEFAULT_GATE_THRESHOLD, gate=None):
+    """Predict dominant emotion from a video source until 'q' is pressed or video ends."""
+    import cv2
+
+    # Determine if source is a video file (string path) or webcam (integer)
+    is_file = isinstance(video_source, str) and os.path.isfile(video_source)
+
+    cap = cv2.VideoCapture(video_source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video source {video_source}")
+
+    if not is_file:
+        print("Press 'q' in the window to stop measuring emotions and return result.")
+
+    try:
+        return predict_from_frames(
+            _iter_sampled_frames(cap, fps, is_file),
+            weights_path=weights_path,
+            batch_size=batch_size,
+            show_window=show_window,
+            wait_for_quit=show_window and not is_file,
+            gate_threshold=gate_threshold,
+            gate=gate,
+        )
+    finally:
+        cap.release()
+
+
+def _unit_interval(value: str) -> float:
+    threshold = float(value)
+    if not 0 <= threshold <= 1:
+        raise argparse.ArgumentTypeError(f"must be between 0 and 1, got {value}")
+    return threshold
+
+
 def _cli(argv):
     parser = argparse.ArgumentParser(description="Predict dominant emotion from video using MER model")
     parser.add_argument("--weights", "-w", default=None, help="Path to MER weights (defaults to MERCnn.pth)")
     parser.add_argument("--video", "-v", default="1", type=str, help="Video source (1 for webcam or path to video file)")
     parser.add_argument("--no-window", action="store_true", help="Disable live video display")
     parser.add_argument("--json", "-j", default="data.json", help="Path to JSON file to update with emotion")
+    parser.add_argument("--model-selection", type=int, choices=[0, 1], default=0,
+                        help="MediaPipe face model: 0 for faces within 2m, 1 for up to 5m (default: 0)")
+    parser.add_argument("--min-confidence", type=float, default=0.5,
+                        help="Minimum face detection confidence (default: 0.5)")
+    parser.add_argument("--gate-threshold", type=_unit_interval, default=DEFAULT_GATE_THRESHOLD,
+                        help=f"Reuse the previous prediction when a crop differs by at most this much (0-1, default: {DEFAULT_GATE_THRESHOLD})")
+    parser.add_argument("--no-gate", action="store_true", help="Run the model on every sampled crop")
     args = parser.parse_args(argv)
 
     video_source = args.video
@@ -125,9 +246,17 @@ def _cli(argv):
         video_source = int(video_source)
 
     try:
-        emotion, counts = predict_from_video(args.weights, video_source, show_window=not args.no_window)
+        import MER
+        MER.configure_face_detection(model_selection=args.model_selection,
+                                     min_detection_confidence=args.min_confidence)
+
+        gate = None if args.no_gate else MER.PredictionGate(threshold=args.gate_threshold)
+        emotion, counts = predict_from_video(args.weights, video_source, show_window=not args.no_window,
+                                             gate_threshold=None, gate=gate)
         print(f"\nPredicted dominant emotion: {emotion}")
         print(f"Counts per emotion: {dict(zip(EMOTIONS, counts))}")
+        if gate is not None:
+            print(f"Skipped inference on {gate.skipped}/{gate.total} crops ({gate.skip_rate:.0%})")
 
         # Update JSON file
         if os.path.isfile(args.json):
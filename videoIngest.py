@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Single-pass video ingest.
+
+Demuxes and decodes a video container once with ffmpeg and feeds both
+consumers from that one process:
+
+- video frames, already decimated to the target fps and scaled for face
+  detection, as raw BGR arrays on stdout
+- ASR-ready 16 kHz mono PCM on a second pipe, written to a WAV file as it arrives
+
+Usage:
+    from videoIngest import VideoIngest
+
+    ingest = VideoIngest("clip.mp4", fps=2, wav_path="clip.wav")
+    try:
+        for timestamp, frame in ingest.frames():
+            ...
+    finally:
+        ingest.close()
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import wave
+
+import numpy as np
+
+
+def probe_video(video_path: str) -> dict:
+    """Read stream metadata with ffprobe (container headers only, no decoding).
+
+    Returns:
+        dict with width, height (display orientation) and has_audio.
+
+    Raises:
+        ValueError: If the file has no readable video stream.
+        RuntimeError: If ffprobe is not installed.
+    """
+    try:
+        proc = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-show_entries', 'stream=codec_type,width,height:stream_tags=rotate:stream_side_data=rotation',
+            '-of', 'json',
+            video_path
+        ], capture_output=True, text=True, check=True)
+        streams = json.loads(proc.stdout).get("streams", [])
+    except FileNotFoundError as e:
+        # Not a missing video: callers report FileNotFoundError as one
+        raise RuntimeError("ffprobe not found on PATH") from e
+    except (subprocess.CalledProcessError, ValueError) as e:
+        raise ValueError(f"Could not open video file: {video_path}") from e
+
+    video = next((s for s in streams if s.get("codec_type") == "video" and s.get("width")), None)
+    if video is None:
+        raise ValueError(f"Could not open video file: {video_path}")
+
+    width, height = int(video["width"]), int(video["height"])
+
+    # ffmpeg auto-rotates on decode, so report the displayed orientation
+    rotation = video.get("tags", {}).get("rotate")
+    for side_data in video.get("side_data_list", []):
+        rotation = side_data.get("rotation", rotation)
+    if rotation is not None and abs(int(float(rotation))) % 180 == 90:
+        width, height = height, width
+
+    return {
+        "width": width,
+        "height": height,
+        "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+    }
+
+
+class VideoIngest:
+    """One ffmpeg process that emits sampled video frames and ASR-ready PCM.
+
+    Args:
+        video_path: Path to the video file.
+        fps: Frames per second to emit (decimation happens inside ffmpeg).
+        max_width: Frames wider than this are downscaled for detection (aspect kept).
+        wav_path: Where to write the 16 kHz mono WAV. None skips audio.
+        sample_rate: PCM sample rate for the audio output.
+
+    Raises:
+        ValueError: If the video cannot be probed.
+        RuntimeError: If ffprobe is not installed (ffmpeg is checked when frames() starts).
+    """
+
+    def __init__(self, video_path: str, fps: float = 2, max_width: int = 640,
+                 wav_path: str = None, sample_rate: int = 16000):
+        self.video_path = video_path
+        self.fps = fps
+        self.wav_path = wav_path
+        self.sample_rate = sample_rate
+
+        info = probe_video(video_path)
+        self.has_audio = info["has_audio"]
+        width, height = info["width"], info["height"]
+        if max_width and width > max_width:
+            height = max(int(round(height * max_width / width / 2)) * 2, 2)
+            width = max_width
+        self.width, self.height = width, height
+
+        self._proc = None
+        self._threads = []
+        self._stderr = []
+        self._audio_error = None
+        self.audio_bytes = 0
+
+    def _start(self):
+        cmd = [
+            'ffmpeg', '-v', 'error', '-nostdin', '-i', self.video_path,
+            # Output 1: decimated, scaled BGR frames on stdout
+            '-map', '0:v:0', '-an',
+            '-vf', f'fps={self.fps},scale={self.width}:{self.height}',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1',
+        ]
+
+        pass_fds = ()
+        audio_read = None
+        if self.wav_path and self.has_audio:
+            audio_read, audio_write = os.pipe()
+            pass_fds = (audio_write,)
+            # Output 2: mono 16-bit PCM on an extra pipe for speech recognition
+            cmd += [
+                '-map', '0:a:0', '-vn',
+                '-acodec', 'pcm_s16le', '-ar', str(self.sample_rate), '-ac', '1',
+                '-f', 's16le', f'pipe:{audio_write}',
+            ]
+
+        try:
+            self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                          pass_fds=pass_fds)
+        except FileNotFoundError as e:
+            if audio_read is not None:
+                os.close(audio_read)
+            raise RuntimeError("ffmpeg not found on PATH") from e
+        finally:
+            for fd in pass_fds:
+                os.close(fd)  # the child holds its own copy; ours would keep the pipe open
+
+        self._spawn(self._drain_stderr)
+        if audio_read is not None:
+            self._spawn(self._write_wav, audio_read)
+
+    def _spawn(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _drain_stderr(self):
+        for line in self._proc.stderr:
+            self._stderr.append(line.decode(errors="replace"))
+
+    def _write_wav(self, fd):
+        try:
+            with os.fdopen(fd, 'rb') as pcm, wave.open(self.wav_path, 'wb') as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(self.sample_rate)
+                while True:
+                    chunk = pcm.read(64 * 1024)
+                    if not chunk:
+                        break
+                    wav.writeframes(chunk)
+                    self.audio_bytes += len(chunk)
+        except Exception as e:
+            self._audio_error = e
+
+    def frames(self):
+        """Yield (timestamp_seconds, frame) for each sampled frame; frame is H x W x 3 uint8 BGR.
+
+        Raises:
+            RuntimeError: If ffmpeg is not installed.
+        """
+        if self._proc is None:
+            self._start()
+
+        frame_size = self.width * self.height * 3
+        index = 0
+        while True:
+            data = self._proc.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            yield index / self.fps, np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)
+            index += 1
+
+    def close(self):
+        """Wait for ffmpeg and the audio writer to finish.
+
+        Raises:
+            RuntimeError: If ffmpeg failed or the audio could not be written.
+        """
+        if self._proc is None:
+            return
+        # Drain any frames the consumer did not read so ffmpeg can finish writing the audio
+        while self._proc.stdout.read(1024 * 1024):
+            pass
+        self._proc.stdout.close()
+        returncode = self._proc.wait()
+        for thread in self._threads:
+            thread.join()
+        self._proc = None
+
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg failed ({returncode}): {''.join(self._stderr).strip()}")
+        if self._audio_error is not None:
+            raise RuntimeError(f"Failed to write audio: {self._audio_error}")
+
+    def abort(self):
+        """Stop ffmpeg immediately, e.g. when the frame consumer raised."""
+        if self._proc is None:
+            return
+        self._proc.kill()
+        self._proc.stdout.close()
+        self._proc.wait()
+        for thread in self._threads:
+            thread.join()
+        self._proc = None
+
+
+def _cli():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Decode a video once into sampled frames and ASR-ready audio")
+    parser.add_argument("video", help="Path to the input video file")
+    parser.add_argument("--fps", type=float, default=2, help="Frames per second to emit (default: 2)")
+    parser.add_argument("--max-width", type=int, default=640, help="Downscale frames wider than this (default: 640)")
+    parser.add_argument("--wav", default=None, help="Write 16 kHz mono audio to this WAV file")
+    args = parser.parse_args()
+
+    try:
+        ingest = VideoIngest(args.video, fps=args.fps, max_width=args.max_width, wav_path=args.wav)
+        count = sum(1 for _ in ingest.frames())
+        ingest.close()
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"{count} frames at {ingest.width}x{ingest.height}, {ingest.audio_bytes} bytes of PCM audio")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_cli())